@@ -1,19 +1,33 @@
 #!/usr/bin/env python3
 """Pull every card's detail (chapters) via the local proxy (127.0.0.1:8123) and save a
 single catalog.json the prototype/firmware can use offline. READ-ONLY (no playback)."""
-import json, urllib.request, time
+import json, urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 PROXY = "http://127.0.0.1:8123"
+WORKERS = 3          # concurrent detail fetches — kept low: every one is a live upstream call
+                     # through the proxy, and Yoto rate-limits (the old loop paced at 0.1s)
+
+def fetch_chapters(cid):
+    d = json.loads(urllib.request.urlopen(f"{PROXY}/card/{cid}", timeout=20).read())
+    card = d.get("card") or d
+    return [{
+        "key": ch.get("key"),
+        "title": ch.get("title"),
+        "duration": ch.get("duration"),
+        "tracks": len(ch.get("tracks") or []),
+    } for ch in ((card.get("content") or {}).get("chapters") or [])]
+
 fam = json.load(open("fam.json"))["cards"]
 cat, fails = [], []
-for i, c in enumerate(fam):
+for c in fam:
     cid = c.get("cardId")
     if not cid:
         continue
     base_card = c.get("card") or {}
     content0 = base_card.get("content") or {}
     meta0 = base_card.get("metadata") or {}
-    entry = {
+    cat.append({
         "cardId": cid,
         "title": base_card.get("title") or cid,
         "img": f"images/{cid}.png",
@@ -21,23 +35,19 @@ for i, c in enumerate(fam):
         "description": meta0.get("description"),
         "lastPlayedAt": c.get("lastPlayedAt"),
         "chapters": [],
-    }
-    try:
-        d = json.loads(urllib.request.urlopen(f"{PROXY}/card/{cid}", timeout=20).read())
-        card = d.get("card") or d
-        for ch in ((card.get("content") or {}).get("chapters") or []):
-            entry["chapters"].append({
-                "key": ch.get("key"),
-                "title": ch.get("title"),
-                "duration": ch.get("duration"),
-                "tracks": len(ch.get("tracks") or []),
-            })
-    except Exception as e:
-        fails.append((cid, str(e)))
-    cat.append(entry)
-    if i % 10 == 0:
-        print(f"  ...{i+1}/{len(fam)}")
-    time.sleep(0.1)
+    })
+
+# Fan the per-card round trips out instead of paying them one after another; results are
+# collected in library order so catalog.json stays stable run to run.
+with ThreadPoolExecutor(WORKERS) as pool:
+    jobs = [(entry, pool.submit(fetch_chapters, entry["cardId"])) for entry in cat]
+    for i, (entry, job) in enumerate(jobs):
+        try:
+            entry["chapters"] = job.result()
+        except Exception as e:
+            fails.append((entry["cardId"], str(e)))
+        if i % 10 == 0:
+            print(f"  ...{i+1}/{len(cat)}")
 
 json.dump(cat, open("catalog.json", "w"))
 total_ch = sum(len(x["chapters"]) for x in cat)
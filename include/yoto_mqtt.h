@@ -40,8 +40,9 @@ static const int HW_VOL_MAX = 16;   // player volume is a raw 0..16 scale; event
 enum Status { ST_UNKNOWN = 0, ST_STOPPED, ST_PAUSED, ST_PLAYING };
 
 // Last-known live playback snapshot. Strings are fixed buffers so the whole struct copies by
-// value under the mutex (no heap, no dangling). seq bumps on every applied event so the LVGL
-// side can detect "something changed" cheaply.
+// value under the mutex (no heap, no dangling). seq bumps when an event actually changes the
+// snapshot (or answers a resync we asked for — see parse_event) so the LVGL side can detect
+// "something changed" cheaply.
 struct Live {
   char     cardId[48];
   char     chapterKey[16];
@@ -51,8 +52,8 @@ struct Live {
   int      volume;         // 0..100 (converted from the raw 0..16 the player reports)
   Status   status;
   bool     online;
-  uint32_t seq;            // bumped on each applied update (0 = nothing ever received)
-  uint32_t ts;             // millis() of the last update
+  uint32_t seq;            // bumped on each CHANGING update / resync answer (0 = none yet)
+  uint32_t ts;             // millis() of the last event received, changed or not
 };
 
 static esp_mqtt_client_handle_t s_cli = nullptr;
@@ -68,6 +69,7 @@ static char   s_rawev[1024] = {0};              // last complete payload, verbat
 static char   s_topic[96]   = {0};
 static char   s_acc[2048];  static int s_acclen = 0, s_acctotal = 0;   // chunk reassembly
 static uint32_t s_evt_count = 0, s_err_count = 0;   // diag counters (32-bit r/w is atomic here)
+static volatile bool s_resync = false;          // next event applies even if unchanged (see request_state)
 
 static void cpystr(char* d, size_t n, const char* s){ if(s) strlcpy(d, s, n); }
 
@@ -83,9 +85,24 @@ struct PsramAllocator : ArduinoJson::Allocator {
 };
 static PsramAllocator s_json_alloc;
 
+// True when two snapshots carry the same playback facts (seq/ts bookkeeping ignored).
+static bool live_same(const Live& a, const Live& b){
+  return a.position == b.position && a.trackLength == b.trackLength && a.volume == b.volume &&
+         a.status == b.status && a.online == b.online &&
+         !strcmp(a.cardId, b.cardId) && !strcmp(a.chapterKey, b.chapterKey) &&
+         !strcmp(a.chapterTitle, b.chapterTitle);
+}
+
 // Parse one data/events (or data/status) payload into the live snapshot. Fields are copied
 // only when PRESENT, so a partial event doesn't wipe what we already know. Field names follow
 // the proxy / cdnninja-yoto_api spec; verify against /mqtt's raw capture and adjust if needed.
+// seq only bumps when the facts actually changed: the player repeats itself a lot (status
+// mirrors, answers to our own state requests), and an unchanged event shouldn't make the LVGL
+// side re-apply and repaint. The one exception is a resync we asked for — that must land even
+// if identical, so it can overwrite an optimistic local guess that never reached the player.
+// Only a payload carrying playback facts (playbackStatus / position) answers the resync: the
+// broker's ack on `response` and bare data/status payloads also arrive first and must not
+// consume the flag, or the real data/events answer would then be dropped as "unchanged".
 static void parse_event(const char* json, int len){
   JsonDocument doc(&s_json_alloc);
   if(deserializeJson(doc, json, len)){ s_err_count++; return; }
@@ -93,23 +110,27 @@ static void parse_event(const char* json, int len){
   if(o.isNull()) return;
 
   xSemaphoreTake(s_mtx, portMAX_DELAY);
-  cpystr(s_live.cardId,       sizeof s_live.cardId,       o["cardId"]);
-  cpystr(s_live.chapterKey,   sizeof s_live.chapterKey,   o["chapterKey"]);
-  cpystr(s_live.chapterTitle, sizeof s_live.chapterTitle, o["chapterTitle"]);
-  if(!o["position"].isNull())    s_live.position    = o["position"]    | s_live.position;
-  if(!o["trackLength"].isNull()) s_live.trackLength = o["trackLength"] | s_live.trackLength;
+  Live n = s_live;
+  cpystr(n.cardId,       sizeof n.cardId,       o["cardId"]);
+  cpystr(n.chapterKey,   sizeof n.chapterKey,   o["chapterKey"]);
+  cpystr(n.chapterTitle, sizeof n.chapterTitle, o["chapterTitle"]);
+  if(!o["position"].isNull())    n.position    = o["position"]    | n.position;
+  if(!o["trackLength"].isNull()) n.trackLength = o["trackLength"] | n.trackLength;
   if(!o["volume"].isNull()){
     int raw = o["volume"] | 0;                  // raw 0..16 -> percent; pass through if already 0..100
-    s_live.volume = (raw <= HW_VOL_MAX) ? (int)(raw * 100.0 / HW_VOL_MAX + 0.5) : raw;
+    n.volume = (raw <= HW_VOL_MAX) ? (int)(raw * 100.0 / HW_VOL_MAX + 0.5) : raw;
   }
   const char* ps = o["playbackStatus"];
   if(ps){
-    s_live.status = !strcmp(ps, "playing") ? ST_PLAYING
-                  : !strcmp(ps, "paused")  ? ST_PAUSED  : ST_STOPPED;
+    n.status = !strcmp(ps, "playing") ? ST_PLAYING
+             : !strcmp(ps, "paused")  ? ST_PAUSED  : ST_STOPPED;
   }
-  s_live.online = true;
-  s_live.seq++;
-  s_live.ts = millis();
+  n.online = true;
+  bool facts = ps || !o["position"].isNull();
+  if(!live_same(n, s_live) || (s_resync && facts)) n.seq++;
+  if(facts) s_resync = false;
+  n.ts = millis();                              // last heard from, changed or not (/mqtt ageMs)
+  s_live = n;
   xSemaphoreGive(s_mtx);
 }
 
@@ -119,10 +140,13 @@ static void on_event(void*, esp_event_base_t, int32_t id, void* data){
     case MQTT_EVENT_CONNECTED: {
       s_conn = true; s_was_up = true;
       String base = "device/" + s_devid + "/";
-      esp_mqtt_client_subscribe(s_cli, (base + "data/events").c_str(), 0);
-      esp_mqtt_client_subscribe(s_cli, (base + "data/status").c_str(), 0);
-      esp_mqtt_client_subscribe(s_cli, (base + "response").c_str(),    0);
+      // one SUBSCRIBE carrying all three filters (one SUBACK) instead of a round trip each;
+      // the Strings must outlive the call — esp-mqtt copies the filters into the packet.
+      String ev = base + "data/events", st = base + "data/status", rs = base + "response";
+      const esp_mqtt_topic_t subs[] = { { ev.c_str(), 0 }, { st.c_str(), 0 }, { rs.c_str(), 0 } };
+      esp_mqtt_client_subscribe_multiple(s_cli, subs, sizeof subs / sizeof subs[0]);
       // nudge the player to push its state now (it won't otherwise)
+      s_resync = true;
       esp_mqtt_client_publish(s_cli, (base + "command/events/request").c_str(), "", 0, 0, 0);
       esp_mqtt_client_publish(s_cli, (base + "command/status/request").c_str(), "", 0, 0, 0);
       break;
@@ -237,8 +261,10 @@ inline void snapshot(Live& out){
 
 // Ask the player to re-push its state (periodic keepalive + manual resync). Thread-safe.
 inline void request_state(){
-  if(s_cli && s_conn)
+  if(s_cli && s_conn){
+    s_resync = true;
     esp_mqtt_client_publish(s_cli, ("device/" + s_devid + "/command/events/request").c_str(), "", 0, 0, 0);
+  }
 }
 
 } // namespace ymqtt
@@ -8,6 +8,7 @@
 // Waveshare ESP32-S3-Touch-LCD-4.3B · arduino-esp32 3.3.9 · LVGL 8.4 · ArduinoJson 7.
 
 #include <Arduino.h>
+#include <algorithm>
 #include <Wire.h>
 #include <WiFi.h>
 #include <HTTPClient.h>
@@ -102,12 +103,26 @@ static bool sd_cache_read(const String& id, int W, uint8_t* buf, size_t want){
   f.close();
   return ok;
 }
-static void sd_cache_write(const String& id, int W, const uint8_t* buf, size_t want){
-  if(!s_sd_ok) return;
+static bool sd_cache_write(const String& id, int W, const uint8_t* buf, size_t want){
+  if(!s_sd_ok) return false;
   File f = SD.open(sd_cache_path(id, W), FILE_WRITE);   // "w" => truncate+write a fresh blob
-  if(!f) return;
-  f.write(buf, want);
+  if(!f) return false;
+  bool ok = f.write(buf, want) == want;
   f.close();
+  return ok;
+}
+
+// Negative cache: a zero-byte {id}.none marks a card the CDN definitively has no cover for (no
+// imageL, or a 4xx other than 408/429), so later boots skip it with one SD lookup instead of
+// re-running the 3x TLS retry every time. Only written for definitive misses — a transport
+// hiccup or a rate limit never sticks.
+// GET /sd?clearnone wipes them if a cover shows up upstream later.
+static String sd_none_path(const String& id){ return String(SD_DIR) + "/" + id + ".none"; }
+static bool sd_none_has(const String& id){ return s_sd_ok && SD.exists(sd_none_path(id)); }
+static void sd_none_mark(const String& id){
+  if(!s_sd_ok) return;
+  File f = SD.open(sd_none_path(id), FILE_WRITE);
+  if(f) f.close();
 }
 
 // One small binary blob per card holding the slim chapter list, so the detail screen opens
@@ -268,6 +283,7 @@ struct Card {
   bool   daily=false;                      // synthetic "Yoto Daily" tile — one-tap, plays today
   lv_obj_t* tile=nullptr;                  // the lv_img tile in the grid
   uint8_t*  thumb=nullptr;                 // PSRAM RGB565 buffer (persists for image lifetime)
+  uint8_t   sd=0;                          // warmer's SD-cache index: SDC_* bits present on SD
   lv_img_dsc_t dsc{};                       // descriptor LVGL renders from
 };
 
@@ -279,6 +295,23 @@ static const char* YOTO_DAILY_COVER  =
   "https://card-content.yotoplay.com/yoto/pub/jC1GVU5Iwhl0yo5Lpcsn_OtXvp-5q2H2KwGAqeZR9ds";
 static Card s_cards[64];
 static int  s_card_count=0;
+
+// Card::sd bits — which of a card's cache files are on SD. Filled from one SD_DIR listing by
+// precache_index(), then kept current by every write site (card_sd_mark), so the warmer never
+// re-fetches something a detail open / play / grid load already cached.
+#define SDC_CHAP   0x01          // {id}.chap
+#define SDC_DCOVER 0x02          // {id}_<DCOVER_W>.565
+#define SDC_NCOVER 0x04          // {id}_<NCOVER_W>.565
+#define SDC_NONE   0x08          // {id}.none (coverless — see sd_none_mark)
+static bool s_pc_indexed = false;// Card::sd bits filled from the SD_DIR listing (precache_index)
+static void card_sd_mark(const String& id, uint8_t bit){
+  if(!bit) return;
+  for(int i = 0; i < s_card_count; i++) if(s_cards[i].id == id){ s_cards[i].sd |= bit; return; }
+}
+static bool card_sd_has(const String& id, uint8_t bit){
+  for(int i = 0; i < s_card_count; i++) if(s_cards[i].id == id) return s_cards[i].sd & bit;
+  return false;
+}
 static lv_obj_t* s_status=nullptr;
 static lv_obj_t* s_barlabel=nullptr;        // idle-state hint / cover-load progress (left side)
 static lv_obj_t* s_bar=nullptr;             // home bottom bar — holds the mini now-playing
@@ -323,6 +356,7 @@ static lv_img_dsc_t s_ncover_dsc{};
 static lv_obj_t* s_np_barfill=nullptr;      // live now-playing widgets (null when off-screen)
 static lv_obj_t* s_np_tcur=nullptr;
 static lv_obj_t* s_np_trem=nullptr;
+static int s_np_shown_pos=-1, s_np_shown_dur=-1;   // what the bar/times show (-1: fresh widgets)
 static lv_obj_t* s_np_playicon=nullptr;
 static lv_obj_t* s_np_chapter=nullptr;
 static lv_obj_t* s_np_sleep=nullptr;        // "Zz 23m" sleep-timer chip on the now screen
@@ -644,13 +678,13 @@ static bool fetch_library(){
     s_cards[s_card_count].cover = (const char*)(c["card"]["content"]["cover"]["imageL"] | "");
     s_card_count++;
   }
-  // recently-played first — ISO-8601 timestamps sort lexically; "" (never played) sinks last
-  for(int a=0;a<s_card_count;a++)
-    for(int b=a+1;b<s_card_count;b++)
-      if(s_cards[b].lp > s_cards[a].lp){ Card t=s_cards[a]; s_cards[a]=s_cards[b]; s_cards[b]=t; }
+  // recently-played first — ISO-8601 timestamps sort lexically; "" (never played) sinks last.
+  // std::sort MOVES the Cards (String buffers change hands); the old exchange sort deep-copied
+  // four Strings three times per swap, O(n^2) times, all through the scarce internal heap.
+  std::sort(s_cards, s_cards + s_card_count, [](const Card& a, const Card& b){ return a.lp > b.lp; });
   // inject the "Yoto Daily" tile at the front (it's not in the library — see YOTO_DAILY_ID)
   if(s_card_count < 64){
-    for(int k=s_card_count; k>0; k--) s_cards[k] = s_cards[k-1];
+    for(int k=s_card_count; k>0; k--) s_cards[k] = std::move(s_cards[k-1]);
     s_cards[0] = Card{};
     s_cards[0].id = YOTO_DAILY_ID; s_cards[0].title = "Yoto Daily";
     s_cards[0].cover = YOTO_DAILY_COVER; s_cards[0].daily = true;
@@ -666,6 +700,7 @@ static bool fetch_library(){
 // so it sits letterboxed in the tile instead of filling from the corner.
 struct DecCtx { uint8_t* buf; int W; int H; int xoff; int yoff; };
 static String s_thumb_diag;     // why the last cover decode failed (surfaced on-screen, no serial)
+static bool   s_cover_gone;     // last fetch_cover miss was definitive (no URL / 4xx bar 408,429), not transient
 static bool   s_png_done;       // set by pngle's done-callback when IEND is reached
 
 static inline void put_px(DecCtx* c, int px, int py, uint16_t v){
@@ -700,7 +735,8 @@ static int jpg_draw(JPEGDRAW* d){
 static bool fetch_cover(const String& coverBase, int W, int H, uint8_t* buf){
   String base = coverBase;
   int q = base.indexOf('?'); if(q >= 0) base = base.substring(0, q);   // drop any existing query
-  if(base.length() == 0){ s_thumb_diag = "no cover url"; return false; }
+  s_cover_gone = false;
+  if(base.length() == 0){ s_thumb_diag = "no cover url"; s_cover_gone = true; return false; }
   String url = base + "?width=" + W + "&quality=70";
   uint8_t* img = nullptr;
   size_t got = 0;
@@ -711,7 +747,12 @@ static bool fetch_cover(const String& coverBase, int W, int H, uint8_t* buf){
     if(!http.begin(cli, url)){ s_thumb_diag = "begin fail heap=" + String(ESP.getFreeHeap()); return false; }
     http.setTimeout(8000);
     int code = http.GET();
-    if(code != 200){ s_thumb_diag = "HTTP " + String(code) + " heap=" + String(ESP.getFreeHeap()); http.end(); return false; }
+    if(code != 200){
+      s_thumb_diag = "HTTP " + String(code) + " heap=" + String(ESP.getFreeHeap());
+      // 4xx = the CDN has no such image — except 408/429, which are "try again later"
+      s_cover_gone = (code >= 400 && code < 500 && code != 408 && code != 429);
+      http.end(); return false;
+    }
     int len = http.getSize();
     WiFiClient* stream = http.getStreamPtr();
     // Buffer the whole (small, ~5-20KB) image, then dispatch by format — JPEG isn't streamable
@@ -776,14 +817,21 @@ static bool fetch_cover(const String& coverBase, int W, int H, uint8_t* buf){
 // get their own cached size.
 static bool load_cover_cached(const String& id, const String& coverUrl, int W, int H, size_t sz, uint8_t* buf){
   if(sd_cache_read(id, W, buf, sz)) return true;
+  // once the warmer has indexed SD_DIR the .none bit is authoritative — skip the FAT walk
+  if(s_pc_indexed ? card_sd_has(id, SDC_NONE) : sd_none_has(id)){
+    s_thumb_diag = "no cover (cached)"; s_cover_gone = true; return false;
+  }
   // Retry the CDN fetch a few times — like the API GET, the TLS handshake is flaky under the
   // memory pressure of the concurrent MQTT session, and one success caches the cover for good.
+  // A definitive miss (no URL / 4xx) won't change on retry, so stop and remember it instead.
   bool ok = false;
   for(int a = 0; a < 3 && !ok; a++){
     ok = fetch_cover(coverUrl, W, H, buf);
+    if(!ok && s_cover_gone){ sd_none_mark(id); card_sd_mark(id, SDC_NONE); break; }
     if(!ok) delay(350);
   }
-  if(ok) sd_cache_write(id, W, buf, sz);
+  if(ok && sd_cache_write(id, W, buf, sz))
+    card_sd_mark(id, W == DCOVER_W ? SDC_DCOVER : W == NCOVER_W ? SDC_NCOVER : 0);
   return ok;
 }
 
@@ -834,10 +882,10 @@ static void fmt_mmss(char* b, int s){ if(s<0)s=0; sprintf(b, "%d:%02d", s/60, s%
 static void fmt_total(char* b, int s){ int h=s/3600, m=(s%3600)/60; if(h) sprintf(b,"%dh %dm",h,m); else sprintf(b,"%dm",m); }
 
 // Persist the freshly-parsed chapter list (in the s_ch globals) for this card to SD.
-static void sd_chap_write(const String& id){
-  if(!s_sd_ok) return;
+static bool sd_chap_write(const String& id){
+  if(!s_sd_ok) return false;
   File f = SD.open(sd_chap_path(id), FILE_WRITE);
-  if(!f) return;
+  if(!f) return false;
   f.write((const uint8_t*)&CHAP_MAGIC, 2);
   sd_wr_str(f, s_detail_title);
   uint16_t n = (uint16_t)s_ch_count;
@@ -849,6 +897,7 @@ static void sd_chap_write(const String& id){
     sd_wr_str(f, s_ch[k].title);
   }
   f.close();
+  return true;
 }
 
 // Load this card's chapter list from SD into the s_ch globals. Returns false on any miss/short
@@ -913,7 +962,7 @@ static bool fetch_card_detail(int i){
     s_ch[s_ch_count].dur   = (int)(ch["duration"] | 0);
     s_ch_count++;
   }
-  sd_chap_write(c.id);                          // write-through so the next open is instant
+  if(sd_chap_write(c.id)) c.sd |= SDC_CHAP;      // write-through so the next open is instant
   return true;
 }
 
@@ -922,12 +971,38 @@ static bool fetch_card_detail(int i){
 // absent), walking the catalog during idle to fetch whatever isn't cached yet: the slim chapter
 // list and the detail-size cover. Result: every card's detail screen opens instantly and offline.
 // One network fetch per call; the loop() caller gates it to idle home/screensaver time so the
-// ~1s blocking fetch never interrupts a tap. A fully-warm library costs only cheap SD.exists()
-// checks, so the scan completes in microseconds and latches s_pc_done.
+// ~1s blocking fetch never interrupts a tap. What's already on SD comes from ONE listing of
+// SD_DIR on the first step (per-card SD.exists() is a linear FAT directory walk each, so three of
+// them per card went quadratic as the cache grew); a fully-warm library then costs only bit tests,
+// the scan completes in microseconds and latches s_pc_done.
 static int  s_pc_cursor = 0;     // next card to inspect
 static int  s_pc_fail   = 0;     // consecutive failures on the current item (bounded, then skip)
 static bool s_pc_done   = false; // whole library warm — stop scanning until the next reboot
 
+// One pass over SD_DIR: map each cache file back to its card and set the matching Card::sd bit.
+static void precache_index(){
+  s_pc_indexed = true;
+  File dir = SD.open(SD_DIR);
+  if(!dir) return;
+  for(File f = dir.openNextFile(); f; f = dir.openNextFile()){
+    String nm = f.name();
+    f.close();
+    uint8_t bit = 0; int cut = -1;
+    if(nm.endsWith(".chap"))      { bit = SDC_CHAP; cut = nm.length() - 5; }
+    else if(nm.endsWith(".none")) { bit = SDC_NONE; cut = nm.length() - 5; }
+    else if(nm.endsWith(".565")){
+      cut = nm.lastIndexOf('_');
+      int w = (cut > 0) ? nm.substring(cut + 1, nm.length() - 4).toInt() : 0;
+      bit = (w == DCOVER_W) ? SDC_DCOVER : (w == NCOVER_W) ? SDC_NCOVER : 0;
+    }
+    if(!bit || cut <= 0) continue;
+    String id = nm.substring(0, cut);
+    for(int i = 0; i < s_card_count; i++)
+      if(s_cards[i].id == id){ s_cards[i].sd |= bit; break; }
+  }
+  dir.close();
+}
+
 // Internal RAM is the board's tightest budget (a cover fetch = a TLS handshake + a PNG/JPEG
 // decode, both hungry for contiguous internal RAM, all while the MQTT TLS session is live). The
 // warmer fires back-to-back fetches, so during a cold mass-warm the low-water can dip to a few
@@ -938,12 +1013,13 @@ static bool s_pc_done   = false; // whole library warm — stop scanning until t
 
 static void precache_step(){
   if(heap_caps_get_largest_free_block(MALLOC_CAP_INTERNAL) < PC_MIN_INTERNAL_BLOCK) return;
+  if(!s_pc_indexed) precache_index();
   while(s_pc_cursor < s_card_count){
     Card& c = s_cards[s_pc_cursor];
     if(c.daily){ s_pc_cursor++; s_pc_fail = 0; continue; }   // Daily has no static detail/chapters
 
     // 1) chapters → {id}.chap
-    if(!SD.exists(sd_chap_path(c.id))){
+    if(!(c.sd & SDC_CHAP)){
       // fetch_card_detail overwrites the shared s_ch globals that tick_cb reads for playback
       // auto-advance. Single-threaded, so just save them and restore before returning — the next
       // tick (next loop iteration) then sees the original playing-card chapter list untouched.
@@ -953,21 +1029,25 @@ static void precache_step(){
       bool ok = fetch_card_detail(s_pc_cursor);              // writes {id}.chap on success
       for(int k=0;k<svc;k++){ s_ch[k] = sv[k]; sv[k].key = String(); sv[k].title = String(); }
       s_ch_count = svc; s_detail_title = svt;
+      if(ok) c.sd |= SDC_CHAP;           // done this boot even if the SD write itself failed
       if(!ok && ++s_pc_fail >= 3){ s_pc_cursor++; s_pc_fail = 0; }   // give up on this card till reboot
       return;                                                // one fetch per call — yield to the UI
     }
-    // 2) detail-size cover → {id}_184.565
-    if(!SD.exists(sd_cache_path(c.id, DCOVER_W))){
+    // 2) detail-size cover → {id}_184.565 (skipped for cards negative-cached as coverless)
+    bool coverless = c.sd & SDC_NONE;
+    if(!coverless && !(c.sd & SDC_DCOVER)){
       if(!s_dcover) s_dcover = (uint8_t*)heap_caps_malloc(DCOVER_SZ, MALLOC_CAP_SPIRAM);
       bool ok = s_dcover && load_cover_cached(c.id, c.cover, DCOVER_W, DCOVER_H, DCOVER_SZ, s_dcover);
+      if(ok) c.sd |= SDC_DCOVER;          // (a definitive miss sets SDC_NONE in load_cover_cached)
       if(!ok && ++s_pc_fail >= 3){ s_pc_cursor++; s_pc_fail = 0; }
       return;
     }
     // 3) now-playing cover → {id}_150.565 (reuse s_dcover as scratch — DCOVER_SZ > NCOVER_SZ,
     //    and no detail screen is live while the warmer runs on home/saver, so it's free)
-    if(!SD.exists(sd_cache_path(c.id, NCOVER_W))){
+    if(!coverless && !(c.sd & SDC_NCOVER)){
       if(!s_dcover) s_dcover = (uint8_t*)heap_caps_malloc(DCOVER_SZ, MALLOC_CAP_SPIRAM);
       bool ok = s_dcover && load_cover_cached(c.id, c.cover, NCOVER_W, NCOVER_H, NCOVER_SZ, s_dcover);
+      if(ok) c.sd |= SDC_NCOVER;
       if(!ok && ++s_pc_fail >= 3){ s_pc_cursor++; s_pc_fail = 0; }
       return;
     }
@@ -1207,9 +1287,13 @@ static int send_cmd(const char* name, const String& body){
   return yoto::post(path, payload.length() ? payload : String("{}"), out);
 }
 
+// Called every tick while playing and on each live update; skip the relabel (2x mm:ss format +
+// label invalidate + bar relayout) when the seconds haven't actually moved since last paint.
 static void np_update_progress(){
   if(!s_np_barfill) return;
   int dur = s_play_dur;
+  if(s_pos == s_np_shown_pos && dur == s_np_shown_dur) return;
+  s_np_shown_pos = s_pos; s_np_shown_dur = dur;
   int pct = dur>0 ? (int)(100L*s_pos/dur) : 0;
   if(pct>100) pct=100;
   lv_obj_set_width(s_np_barfill, lv_pct(pct));
@@ -1235,9 +1319,13 @@ static void saver_tick();   // fwd (defined with the screensaver below)
 
 // ---- live device state (MQTT) -> the optimistic playback vars the UI reads ----
 // Find the grid index of a card by its Yoto cardId (-1 if not in the library / unknown).
+// Live events name the same card over and over, so check the last hit before scanning. The
+// memo is only a hint: it's re-verified against s_cards, so a library refetch can't fool it.
 static int card_index_by_id(const char* id){
+  static int s_last = -1;
   if(!id || !*id) return -1;
-  for(int i = 0; i < s_card_count; i++) if(s_cards[i].id == id) return i;
+  if(s_last >= 0 && s_last < s_card_count && s_cards[s_last].id == id) return s_last;
+  for(int i = 0; i < s_card_count; i++) if(s_cards[i].id == id) return s_last = i;
   return -1;
 }
 
@@ -1257,6 +1345,7 @@ static void apply_live_state(){
   bool   was_playing  = s_playing;
   int    prev_card    = s_play_card;
   String prev_chapter = s_play_chapter;
+  int    prev_cur_ch  = s_cur_ch;
 
   if(lv.status == ymqtt::ST_PLAYING)                                  s_playing = true;
   else if(lv.status == ymqtt::ST_PAUSED || lv.status == ymqtt::ST_STOPPED) s_playing = false;
@@ -1270,7 +1359,10 @@ static void apply_live_state(){
   if(lv.volume > 0) s_vol = lv.volume;
   if(s_cur_card == s_play_card && s_play_ch >= 0) s_cur_ch = s_play_ch;  // keep now-playing labels aligned
 
-  np_set_chapter_label(); np_set_playicon(); np_update_progress();
+  // touch only the widgets whose backing field moved (each set_text invalidates + redraws)
+  if(s_cur_ch != prev_cur_ch)    np_set_chapter_label();
+  if(s_playing != was_playing)   np_set_playicon();
+  np_update_progress();          // memoised on the shown pos/dur itself
   if(s_playing != was_playing || s_play_card != prev_card || s_play_chapter != prev_chapter)
     update_home_bar();
 }
@@ -1544,6 +1636,7 @@ static void open_now(){
   lv_obj_set_style_pad_all(track, 0, 0);
   lv_obj_clear_flag(track, LV_OBJ_FLAG_SCROLLABLE);
   s_np_barfill=lv_obj_create(track);
+  s_np_shown_pos=s_np_shown_dur=-1;          // new widgets are blank — next update must paint
   lv_obj_set_size(s_np_barfill, lv_pct(0), 12);
   lv_obj_align(s_np_barfill, LV_ALIGN_LEFT_MID, 0, 0);
   lv_obj_set_style_radius(s_np_barfill, 6, 0);
@@ -2077,13 +2170,15 @@ static void ota_begin(){
   // SD cache health: is the card mounted, and is the cover/chapter cache actually populating?
   // Lists the first handful of files in /ythumbs with sizes so we can SEE whether detail
   // opens are writing {id}.chap (chapters) and {id}_184.565 (detail cover) blobs.
+  // ?clearnone also deletes the {id}.none coverless markers so those covers are retried.
   s_ota_web.on("/sd", [](){
     String out = "{\"mounted\":" + String(s_sd_ok ? 1 : 0);
     if(s_sd_ok){
       out += ",\"type\":" + String((int)SD.cardType());
       out += ",\"sizeMB\":" + String((uint32_t)(SD.cardSize()/(1024ULL*1024ULL)));
       out += ",\"usedMB\":" + String((uint32_t)(SD.usedBytes()/(1024ULL*1024ULL)));
-      int nchap=0, ncover=0, ntot=0;
+      bool clear = s_ota_web.hasArg("clearnone");   // forget negative-cached covers (retry them)
+      int nchap=0, ncover=0, nnone=0, ntot=0;
       String sample = "[";
       File dir = SD.open(SD_DIR);
       if(dir){
@@ -2091,15 +2186,25 @@ static void ota_begin(){
           String nm = f.name();
           if(nm.endsWith(".chap")) nchap++;
           else if(nm.endsWith(".565")) ncover++;
+          else if(nm.endsWith(".none")){
+            nnone++;
+            if(clear){ f.close(); SD.remove(String(SD_DIR) + "/" + nm); continue; }
+          }
           if(ntot < 8){ if(ntot) sample += ","; sample += "\"" + nm + ":" + String((uint32_t)f.size()) + "\""; }
           ntot++;
           f.close();
         }
         dir.close();
       }
+      if(clear){
+        // forget them in the warmer's index too, and re-arm it so those covers are actually retried
+        for(int i = 0; i < s_card_count; i++) s_cards[i].sd &= ~SDC_NONE;
+        s_pc_done = false; s_pc_cursor = 0; s_pc_fail = 0;
+      }
       sample += "]";
       out += ",\"files\":" + String(ntot) + ",\"chap\":" + String(nchap) +
-             ",\"cover\":" + String(ncover) + ",\"sample\":" + sample;
+             ",\"cover\":" + String(ncover) + ",\"none\":" + String(nnone) +
+             (clear ? ",\"cleared\":1" : "") + ",\"sample\":" + sample;
     }
     out += "}";
     s_ota_web.send(200, "application/json", out);
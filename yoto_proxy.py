@@ -26,6 +26,20 @@ try:
 except ImportError:                       # REST path uses curl, not urllib)
     HAVE_MQTT = False
 
+try:
+    from PIL import Image                # only needed to BUILD thumbs; cached .rgb565 still serve
+    import numpy as np
+    HAVE_PIL = True
+except ImportError:
+    HAVE_PIL = False
+
+try:
+    import orjson                        # optional: C parser, ~3x faster on the big library payload
+                                         # (and on every MQTT event)
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
 # ---- cover thumbnails for the board (RGB565, the panel's native pixel format) ----
 # The board can't decode 49 PNGs; we resize the cached covers here and hand it raw
 # little-endian RGB565 (matches LVGL: LV_COLOR_DEPTH 16, LV_COLOR_16_SWAP 0) that it
@@ -47,8 +61,8 @@ def make_thumb(card_id, w=THUMB_W, h=THUMB_H):
         data = open(cache, "rb").read()
         _thumb_mem[key] = data
         return data
-    from PIL import Image
-    import numpy as np
+    if not HAVE_PIL:
+        return None
     im = Image.open(src).convert("RGB").resize((w, h), Image.LANCZOS)
     a = np.asarray(im, dtype=np.uint16)
     r = (a[:, :, 0] >> 3) & 0x1F
@@ -91,8 +105,15 @@ def _curl(args):
 # caller wait and then re-read the freshly-rotated token.
 _token_lock = threading.Lock()
 
-def refresh_token():
+def refresh_token(rejected=None):
+    """Refresh the access token. `rejected` is the token the caller saw fail (default: the
+    current one); if another thread already replaced it while we waited for the lock, reuse
+    that result instead of spending the rotating refresh token a second time."""
+    if rejected is None:
+        rejected = tokens["access_token"]
     with _token_lock:
+        if tokens["access_token"] != rejected:
+            return True
         print("  [proxy] access token rejected -> refreshing ...")
         code, body = _curl(["curl", "-sS", "-X", "POST", AUTH + "/oauth/token",
             "--data-urlencode", "grant_type=refresh_token",
@@ -129,8 +150,9 @@ def _needs_refresh(code, body):
 
 def request(method, path, body=None):
     """upstream() + auto-refresh (handling 401 AND expired-token 403), retried once."""
+    sent = tokens["access_token"]
     code, resp = upstream(method, path, body)
-    if _needs_refresh(code, resp) and refresh_token():
+    if _needs_refresh(code, resp) and refresh_token(sent):
         code, resp = upstream(method, path, body)
     return code, resp
 
@@ -144,19 +166,33 @@ MQTT_URL  = "aqrphjqbp3u2z-ats.iot.eu-west-2.amazonaws.com"
 MQTT_PORT = 443
 MQTT_AUTH = "PublicJWTAuthorizer"
 HW_VOL_MAX = 16                     # player volume is a raw 0..16 scale; events report it raw
+LOG_EVENTS = False                  # print every raw data/events payload (field capture, e.g. Yoto
+                                    # Daily's id) — off by default: it fires ~1/s while playing
 
+# Copy-on-write: writers build a fresh dict under _state_lock and rebind _state; readers just
+# grab the current reference (a single atomic load) and never lock or see a half-applied event.
 _state_lock = threading.Lock()
 _state = {                          # last-known live state for DEVICE_ID (None = unknown)
     "online": None, "status": None, "cardId": None,
     "chapterKey": None, "chapterTitle": None, "trackKey": None, "trackTitle": None,
-    "position": None, "trackLength": None, "volume": None, "updated": 0.0,
+    "position": None, "trackLength": None, "volume": None,
+    "updated": 0.0,                 # time.monotonic() of the last update (only ever diffed)
 }
+
+def _set_state(changes):
+    global _state
+    with _state_lock:
+        s = dict(_state)
+        s.update(changes)
+        _state = s
+
 # data/events wire-key -> our state key (only playback fields the board needs)
 _EVT_MAP = {
     "cardId": "cardId", "chapterKey": "chapterKey", "chapterTitle": "chapterTitle",
     "trackKey": "trackKey", "trackTitle": "trackTitle",
     "position": "position", "trackLength": "trackLength",
 }
+_MQTT_TOPICS = ("data/events", "data/status", "status/full", "presence")   # under device/{id}/
 _mqtt_disc = threading.Event()      # set by on_disconnect so the worker rebuilds with a fresh JWT
 _mqtt_up   = threading.Event()      # set once a CONNACK-success lands; gates the token-refresh path
 
@@ -168,8 +204,8 @@ def _mqtt_on_connect(client, userdata, flags, reason_code, properties=None):
         print(f"  [mqtt] connect refused: {reason_code}")
         return
     _mqtt_up.set()
-    for suffix in ("data/events", "data/status", "status/full", "presence"):
-        client.subscribe(f"device/{DEVICE_ID}/{suffix}")
+    # one multi-topic SUBSCRIBE (one SUBACK) instead of a round trip per topic
+    client.subscribe([(f"device/{DEVICE_ID}/{suffix}", 0) for suffix in _MQTT_TOPICS])
     # nudge the player to push its current state immediately (it won't otherwise)
     client.publish(f"device/{DEVICE_ID}/command/events/request")
     client.publish(f"device/{DEVICE_ID}/command/status/request")
@@ -181,25 +217,22 @@ def _mqtt_on_message(client, userdata, msg):
         return
     suffix = "/".join(parts[2:])
     try:
-        body = json.loads(msg.payload.decode("utf-8"))
+        body = _loads(msg.payload)       # both parsers take the raw bytes; no decode step
     except Exception:
         return
     if suffix == "data/events":
-        print("  [mqtt] event:", json.dumps(body))   # full raw event (capture Yoto Daily's id/fields)
-    with _state_lock:
-        if suffix == "data/events":
-            for raw, dest in _EVT_MAP.items():
-                if body.get(raw) is not None:
-                    _state[dest] = body[raw]
-            if body.get("playbackStatus") is not None:
-                _state["status"] = str(body["playbackStatus"])   # playing/paused/stopped
-            if body.get("volume") is not None:                   # raw 0..16 -> percentage
-                _state["volume"] = round(int(body["volume"]) / HW_VOL_MAX * 100)
-            _state["online"] = True                              # a live event proves reachability
-            _state["updated"] = time.time()
-        elif suffix == "presence":
-            _state["online"] = (body.get("state") == "online")
-            _state["updated"] = time.time()
+        if LOG_EVENTS:
+            print("  [mqtt] event:", msg.payload.decode("utf-8", "replace"))   # as received
+        ch = {dest: body[raw] for raw, dest in _EVT_MAP.items() if body.get(raw) is not None}
+        if body.get("playbackStatus") is not None:
+            ch["status"] = str(body["playbackStatus"])          # playing/paused/stopped
+        if body.get("volume") is not None:                      # raw 0..16 -> percentage
+            ch["volume"] = round(int(body["volume"]) / HW_VOL_MAX * 100)
+        ch["online"] = True                                     # a live event proves reachability
+        ch["updated"] = time.monotonic()
+        _set_state(ch)
+    elif suffix == "presence":
+        _set_state({"online": body.get("state") == "online", "updated": time.monotonic()})
 
 def _mqtt_on_disconnect(client, userdata, *args):
     print("  [mqtt] disconnected")
@@ -217,7 +250,7 @@ def _mqtt_build():
     c.on_connect = _mqtt_on_connect
     c.on_message = _mqtt_on_message
     c.on_disconnect = _mqtt_on_disconnect
-    return c
+    return c, tok                         # tok: what this session authed with (see refresh below)
 
 def _mqtt_worker():
     """Own one MQTT connection, reconnecting with exponential backoff.
@@ -231,7 +264,7 @@ def _mqtt_worker():
         _mqtt_disc.clear()
         _mqtt_up.clear()
         try:
-            c = _mqtt_build()
+            c, tok = _mqtt_build()
             c.connect(MQTT_URL, MQTT_PORT, keepalive=60)
             c.loop_start()
             _mqtt_disc.wait()             # block until on_disconnect fires
@@ -240,10 +273,9 @@ def _mqtt_worker():
             except Exception: pass
         except Exception as e:
             print("  [mqtt] error:", e)
-        with _state_lock:
-            _state["online"] = None       # connection gone -> truth unknown
+        _set_state({"online": None})     # connection gone -> truth unknown
         if _mqtt_up.is_set():             # was connected then dropped -> JWT likely expired
-            refresh_token()
+            refresh_token(tok)            # no-op if an HTTP thread already rotated it meanwhile
             backoff = 1.0                 # healthy cycle; reset backoff
         else:                             # never got up (TLS/network/auth) -> just back off
             backoff = min(backoff * 2, 60)
@@ -251,9 +283,8 @@ def _mqtt_worker():
 
 def board_state():
     """Slim live snapshot for the board, with an `age` (secs since last MQTT update)."""
-    with _state_lock:
-        s = dict(_state)
-    s["age"] = round(time.time() - s["updated"], 1) if s["updated"] else None
+    s = dict(_state)                      # copy-on-write snapshot: no lock needed to read
+    s["age"] = round(time.monotonic() - s["updated"], 1) if s["updated"] else None
     s.pop("updated", None)
     return s
 
@@ -265,12 +296,18 @@ class Handler(BaseHTTPRequestHandler):
             body = self.rfile.read(n).decode() if n else ""
         code, resp = request(method, self.path, body)
         print(f"  [proxy] {method} {self.path} -> {code} ({len(resp)} bytes)")
+        self._reply(code, resp)
+    def _reply(self, code, out, ctype="application/json"):
+        # One place for the status/header/body dance every handler ends with. `code` is curl's
+        # http_code string ("000" or junk on transport failure -> 502).
         try: status = int(code)
         except ValueError: status = 502
+        data = out.encode() if isinstance(out, str) else out
         self.send_response(status)
-        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
         self.end_headers()
-        self.wfile.write(resp.encode())
+        self.wfile.write(data)
     def _board_cmd(self, name):
         # Slim playback commands from the board -> Yoto device commands. We own the
         # deviceId and clamp volume. Body is JSON (may be empty for pause/resume/stop).
@@ -292,27 +329,18 @@ class Handler(BaseHTTPRequestHandler):
             v = max(0, min(VOL_MAX, int(body.get("volume", 30))))
             cmd, payload = "volume/set", {"volume": v}
         if not cmd:
-            self.send_response(404); self.end_headers(); return
+            return self._reply("404", "{}")
         path = f"/device-v2/{DEVICE_ID}/command/{cmd}"
         data = json.dumps(payload) if payload is not None else None
         code, resp = request("POST", path, data)
         print(f"  [proxy] /board/cmd/{name} -> {cmd} {payload or ''} -> {code}")
-        try: status = int(code)
-        except ValueError: status = 502
-        self.send_response(status); self.send_header("Content-Type", "application/json"); self.end_headers()
-        self.wfile.write(resp.encode())
+        self._reply(code, resp)
 
     def do_GET(self):
         if self.path == "/board/library":
             return self._board_library()
         if self.path == "/board/state":
-            out = json.dumps(board_state()).encode()
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", str(len(out)))
-            self.end_headers()
-            self.wfile.write(out)
-            return
+            return self._reply("200", json.dumps(board_state()))
         if self.path.startswith("/board/thumb/"):
             return self._board_thumb(self.path[len("/board/thumb/"):])
         if self.path.startswith("/board/card/"):
@@ -326,7 +354,7 @@ class Handler(BaseHTTPRequestHandler):
         out = "{}"
         if code == "200":
             try:
-                card = (json.loads(resp).get("card")) or {}
+                card = (_loads(resp).get("card")) or {}
                 chs = (card.get("content") or {}).get("chapters") or []
                 slim = {"title": card.get("title") or card_id,
                         "chapters": [{"k": c.get("key"),
@@ -337,10 +365,7 @@ class Handler(BaseHTTPRequestHandler):
             except Exception as e:
                 code = "500"; out = json.dumps({"error": str(e)})
         print(f"  [proxy] /board/card/{card_id} -> {code} ({len(out)} bytes)")
-        try: status = int(code)
-        except ValueError: status = 502
-        self.send_response(status); self.send_header("Content-Type", "application/json"); self.end_headers()
-        self.wfile.write(out.encode())
+        self._reply(code, out)
 
     def _board_thumb(self, rest):
         # /board/thumb/{id}[?w=&h=]  — default grid size; bigger covers for detail/now-playing.
@@ -360,12 +385,8 @@ class Handler(BaseHTTPRequestHandler):
             data = None
             print(f"  [proxy] /board/thumb/{card_id} ERROR {e}")
         if not data:
-            self.send_response(404); self.end_headers(); return
-        self.send_response(200)
-        self.send_header("Content-Type", "application/octet-stream")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+            return self._reply("404", "{}")
+        self._reply("200", data, "application/octet-stream")
         print(f"  [proxy] /board/thumb/{card_id} {w}x{h} -> 200 ({len(data)} bytes)")
     def do_POST(self):
         if self.path.startswith("/board/cmd/"):
@@ -378,7 +399,7 @@ class Handler(BaseHTTPRequestHandler):
         out = "[]"
         if code == "200":
             try:
-                cards = json.loads(resp).get("cards", [])
+                cards = _loads(resp).get("cards", [])
                 slim = [{"id": c.get("cardId"),
                          "title": ((c.get("card") or {}).get("title")) or c.get("cardId"),
                          "lp": c.get("lastPlayedAt") or ""} for c in cards]
@@ -387,10 +408,7 @@ class Handler(BaseHTTPRequestHandler):
             except Exception as e:
                 code = "500"; out = json.dumps({"error": str(e)})
         print(f"  [proxy] /board/library -> {code} ({len(out)} bytes)")
-        try: status = int(code)
-        except ValueError: status = 502
-        self.send_response(status); self.send_header("Content-Type", "application/json"); self.end_headers()
-        self.wfile.write(out.encode())
+        self._reply(code, out)
     def log_message(self, *a): pass
 
 def reclaim_port(port):
@@ -426,8 +444,10 @@ if __name__ == "__main__":
     print(f"Yoto dev proxy listening on http://0.0.0.0:{PORT}  (LAN-reachable; Ctrl-C to stop)")
     print("Forwarding to", API, "with your stored token (auto-refresh on 401).")
     if HAVE_MQTT:
-        threading.Thread(target=_mqtt_worker, daemon=True).start()
+        threading.Thread(target=_mqtt_worker, name="yoto-mqtt", daemon=True).start()
         print("  [mqtt] live-state thread started -> GET /board/state")
     else:
         print("  [mqtt] paho-mqtt not installed; /board/state will be empty (pip install paho-mqtt)")
+    if not HAVE_PIL:
+        print("  [proxy] Pillow/numpy not installed; only already-cached thumbs will serve (pip install pillow numpy)")
     ThreadingHTTPServer(("0.0.0.0", PORT), Handler).serve_forever()